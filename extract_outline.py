@@ -1,145 +1,266 @@
+import os
 import re
 from pathlib import Path
 import fitz  # PyMuPDF
 import logging
-import ujson  # Faster JSON library
+import orjson  # Faster JSON library
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Multilingual & language-agnostic heading patterns, grouped by script
+_HEADING_PATTERNS = {
+    # English and numeric patterns
+    "latin": [
+        (r"^[A-Z][a-z]+\s+[A-Z0-9IVX]+:?\s+[A-Za-z]{3,}.*", "H2"),
+        (r"^\d+\.\s+[A-Z][a-zA-Z\s]{4,}.*", "H2"),
+        (r"^\d+\.\d+\s+[A-Za-z]{4,}.*", "H3"),
+        (r"^\d+\.\d+\.\d+\s+[A-Za-z]{4,}.*", "H4"),
+        (r"^[A-Z][a-z]{3,}:\s*$", "H2"),
+        (r"^[A-Z][A-Za-z\s&',-]{10,}:\s*$", "H3"),
+        (r"^[A-Z][a-zA-Z\s]{8,}\?$", "H3"),
+        (r"^[A-Z][A-Z\s&',-]{15,}$", "H2"),
+        (r"^[A-Z][a-z]+(?:\s+[A-Z][a-z]+){2,}$", "H3"),
+    ],
+
+    # Japanese heading patterns
+    "japanese": [
+        (r"^第[一二三四五六七八九十百千\d]+章.*", "H2"),             # Chapter like 第1章
+        (r"^[\u4e00-\u9faf]{2,10}$", "H2"),                         # Pure Kanji headings
+        (r"^[\u3040-\u309f\u30a0-\u30ff]{3,}$", "H2"),           # Hiragana/Katakana
+        (r"^[\u4e00-\u9faf\u3040-\u30ff\s]{4,}$", "H3"),         # Mixed Japanese scripts
+    ],
+
+    # Chinese (Simplified/Traditional)
+    "chinese": [
+        (r"^第[一二三四五六七八九十百千\d]+节.*", "H2"),             # Section headings
+        (r"^[\u4e00-\u9fff]{2,10}$", "H2"),                         # Pure Chinese characters
+    ],
+
+    # Korean (Hangul)
+    "korean": [
+        (r"^[\uac00-\ud7af\s]{3,}$", "H2"),                         # Hangul text (Korean script)
+    ],
+
+    # Devanagari (e.g., Hindi)
+    "devanagari": [
+        (r"^[\u0900-\u097F\s]{4,}$", "H2"),                         # Hindi/Sanskrit heading pattern
+    ],
+
+    # Tamil
+    "tamil": [
+        (r"^[\u0B80-\u0BFF\s]{4,}$", "H2")                          # Tamil headings
+    ],
+}
+
+_EXCLUSION_PATTERNS = [
+    r"^Page\s+\d+\s+of\s+\d+$",
+    r"^\d+\s+of\s+\d+$",
+    r"^Page\s+\d+$",
+    r"^\d{1,3}$",
+    r"^[A-Za-z]{1,2}$",
+    r"^\d{1,2}[\/\-\.]\d{1,2}[\/\-\.]\d{2,4}$",
+    r"^\d{1,2}:\d{2}(?::\d{2})?(?:\s*[AP]M)?$",
+    r"^Version\s+[\d\.]+$",
+    r"^©.*$",
+    r"^\s*$",
+    r"^[^\w\s]*$",
+    r"^www\.|@|\.com|\.org|\.net",
+    r"^\d+(?:\.\d+)*\s*%?$",
+    r"^[A-Z]{2,}\s+\d{1,2},?\s+\d{4}$",
+    r"^\w+\s+\d{1,2},?\s+\d{4}$",
+]
+
+def _compile_heading_patterns(groups):
+    """Fuse the patterns of the given script groups into a single alternation.
+    Each pattern gets its own group, so match.lastindex indexes the returned levels"""
+    patterns = [entry for group in groups for entry in _HEADING_PATTERNS[group]]
+    regex = re.compile("|".join(f"({pattern})" for pattern, _ in patterns))
+    return regex, (None,) + tuple(level for _, level in patterns)
+
+# Candidate heading regexes keyed by the script of a line's first character.
+# Group order follows _HEADING_PATTERNS so the first matching pattern still wins
+_HEADING_RES_BY_SCRIPT = {
+    script: _compile_heading_patterns(groups)
+    for script, groups in {
+        "latin": ("latin",),
+        "han": ("japanese", "chinese"),
+        "kana": ("japanese",),
+        "hangul": ("korean",),
+        # Native digits can also start the \d-based numbered patterns
+        "devanagari": ("latin", "devanagari"),
+        "tamil": ("latin", "tamil"),
+        # Leading whitespace can start any of the \s-inclusive patterns
+        "other": tuple(_HEADING_PATTERNS),
+    }.items()
+}
+
+def _script_of(char):
+    """Classify a character into a _HEADING_RES_BY_SCRIPT key (None if no pattern can start with it)"""
+    code = ord(char)
+    if code < 0x80:
+        return "other" if char.isspace() else "latin"
+    if 0x4E00 <= code <= 0x9FFF:
+        return "han"
+    if 0x3040 <= code <= 0x30FF:
+        return "kana"
+    if 0xAC00 <= code <= 0xD7AF:
+        return "hangul"
+    if 0x0900 <= code <= 0x097F:
+        return "devanagari"
+    if 0x0B80 <= code <= 0x0BFF:
+        return "tamil"
+    if char.isdecimal():
+        return "latin"
+    if char.isspace():
+        return "other"
+    return None
+
+_EXCLUSION_RE = re.compile("|".join(f"(?:{pattern})" for pattern in _EXCLUSION_PATTERNS), re.IGNORECASE)
+# Bytes twin for printable-ASCII lines, where the ASCII-only bytes classes agree
+# with the Unicode ones; non-ASCII patterns (©) can never match such text anyway
+_EXCLUSION_RE_BYTES = re.compile(
+    "|".join(f"(?:{pattern})" for pattern in _EXCLUSION_PATTERNS if pattern.isascii()).encode("ascii"),
+    re.IGNORECASE,
+)
+
+# "dict" extraction without embedded image blocks: only text lines are inspected,
+# and copying every image's bytes into the dict dominates extraction time
+_TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+# MuPDF span flag bit marking bold text
+_FLAG_BOLD = 1 << 4
+
+# Longer lines are body paragraphs, never headings
+_MAX_HEADING_LENGTH = 200
+
+_NUMERIC_NOISE_RE = re.compile(r'^[\d\s\-\.\,\/]+$')
+_NUMBERED_LINE_RE = re.compile(r'^\d+\.')
+_ALNUM_OR_SPACE_RE = re.compile(r'[^\W_]|\s')  # \w minus underscore == str.isalnum
+
+# Pure text classifiers, memoized since the same lines (labels, running
+# headers, numbering) recur across pages and documents
+
+@lru_cache(maxsize=4096)
+def _is_structural_noise(text):
+    """Identify text that's likely structural noise rather than content"""
+    # Very short text
+    if len(text.strip()) < 4:
+        return True
+        
+    # Only numbers or simple patterns
+    if _NUMERIC_NOISE_RE.match(text):
+        return True
+        
+    # Check against exclusion patterns
+    if text.isascii() and text.isprintable():
+        if _EXCLUSION_RE_BYTES.match(text.encode("ascii")):
+            return True
+    elif _EXCLUSION_RE.match(text):
+        return True
+            
+    return False
+
+@lru_cache(maxsize=4096)
+def _detect_level(text):
+    """Detect heading level based on patterns"""
+    # Dispatch on the first character's script so only patterns that
+    # can possibly match are tried
+    script = _script_of(text[0]) if text else None
+    if script is None:
+        return None
+    regex, levels = _HEADING_RES_BY_SCRIPT[script]
+    match = regex.match(text)
+    if match:
+        return levels[match.lastindex]
+    return None
+
 class PDFOutlineExtractor:
     def __init__(self):
-        # Multilingual & language-agnostic heading patterns
-        self.patterns = [
-            # English and numeric patterns
-            (r"^[A-Z][a-z]+\s+[A-Z0-9IVX]+:?\s+[A-Za-z]{3,}.*", "H2"),
-            (r"^\d+\.\s+[A-Z][a-zA-Z\s]{4,}.*", "H2"),
-            (r"^\d+\.\d+\s+[A-Za-z]{4,}.*", "H3"),
-            (r"^\d+\.\d+\.\d+\s+[A-Za-z]{4,}.*", "H4"),
-            (r"^[A-Z][a-z]{3,}:\s*$", "H2"),
-            (r"^[A-Z][A-Za-z\s&',-]{10,}:\s*$", "H3"),
-            (r"^[A-Z][a-zA-Z\s]{8,}\?$", "H3"),
-            (r"^[A-Z][A-Z\s&',-]{15,}$", "H2"),
-            (r"^[A-Z][a-z]+(?:\s+[A-Z][a-z]+){2,}$", "H3"),
-
-            # Japanese heading patterns
-            (r"^第[一二三四五六七八九十百千\d]+章.*", "H2"),             # Chapter like 第1章
-            (r"^[\u4e00-\u9faf]{2,10}$", "H2"),                         # Pure Kanji headings
-            (r"^[\u3040-\u309f\u30a0-\u30ff]{3,}$", "H2"),           # Hiragana/Katakana
-            (r"^[\u4e00-\u9faf\u3040-\u30ff\s]{4,}$", "H3"),         # Mixed Japanese scripts
-
-            # Chinese (Simplified/Traditional)
-            (r"^第[一二三四五六七八九十百千\d]+节.*", "H2"),             # Section headings
-            (r"^[\u4e00-\u9fff]{2,10}$", "H2"),                         # Pure Chinese characters
-
-            # Korean (Hangul)
-            (r"^[\uac00-\ud7af\s]{3,}$", "H2"),                         # Hangul text (Korean script)
-
-            # Devanagari (e.g., Hindi)
-            (r"^[\u0900-\u097F\s]{4,}$", "H2"),                         # Hindi/Sanskrit heading pattern
-
-            # Tamil
-            (r"^[\u0B80-\u0BFF\s]{4,}$", "H2")                          # Tamil headings
-        ]
-
-        self.exclusion_patterns = [
-            r"^Page\s+\d+\s+of\s+\d+$",
-            r"^\d+\s+of\s+\d+$",
-            r"^Page\s+\d+$",
-            r"^\d{1,3}$",
-            r"^[A-Za-z]{1,2}$",
-            r"^\d{1,2}[\/\-\.]\d{1,2}[\/\-\.]\d{2,4}$",
-            r"^\d{1,2}:\d{2}(?::\d{2})?(?:\s*[AP]M)?$",
-            r"^Version\s+[\d\.]+$",
-            r"^©.*$",
-            r"^\s*$",
-            r"^[^\w\s]*$",
-            r"^www\.|@|\.com|\.org|\.net",
-            r"^\d+(?:\.\d+)*\s*%?$",
-            r"^[A-Z]{2,}\s+\d{1,2},?\s+\d{4}$",
-            r"^\w+\s+\d{1,2},?\s+\d{4}$",
-        ]
-
         self.text_frequency = Counter()
         self.page_positions = {}
         self.seen_headings = set()
+        self._candidates = []
+        self._repetitive_set = frozenset()
 
     def analyze_document_structure(self, doc):
-        """Analyze document to identify repetitive elements and page structure"""
+        """Analyze document to identify repetitive elements and page structure.
+        Also collects every line that could be a heading into a flat
+        (text, page_num, font_size, is_bold) list for the outline pass"""
         self.text_frequency.clear()
         self.page_positions.clear()
+        self._candidates = []
+        # Running headers/footers can't be told apart from content on
+        # 1-2 page documents, so don't bother counting repetition there
+        track_repetition = len(doc) >= 3
         
         for page_num in range(len(doc)):
             page = doc[page_num]
             page_height = page.rect.height
-            text_dict = page.get_text("dict")
+            # Header/footer bands: top 15% and bottom 15% of the page
+            header_cutoff = page_height * 0.15
+            footer_cutoff = page_height * 0.85
+            text_dict = page.get_text("dict", flags=_TEXT_FLAGS)
             
             for block in text_dict.get("blocks", []):
                 if "lines" in block:
                     block_y = block.get("bbox", [0, 0, 0, 0])[1]  # y-coordinate
-                    position_category = self.categorize_position(block_y, page_height)
+                    position_category = ("header" if block_y < header_cutoff else
+                                         "footer" if block_y > footer_cutoff else
+                                         "body")
                     
                     for line in block["lines"]:
-                        line_text = ""
-                        for span in line.get("spans", []):
-                            line_text += span.get("text", "")
+                        parts = []
+                        font_size = 0
+                        line_flags = 0
                         
-                        text = line_text.strip()
-                        if text and len(text) > 1:
+                        for span in line.get("spans") or ():
+                            parts.append(span.get("text", ""))
+                            size = span.get("size", 0)
+                            if size > font_size:
+                                font_size = size
+                            line_flags |= span.get("flags", 0)
+
+                        text = "".join(parts).strip()
+                        is_bold = bool(line_flags & _FLAG_BOLD)
+                        if len(text) > _MAX_HEADING_LENGTH:
+                            continue
+
+                        # Repetition only matters for header/footer lines short enough
+                        # to pass as headings, so keep body text out of the counters
+                        if track_repetition and position_category != "body" and len(text) > 1:
                             self.text_frequency[text] += 1
-                            if text not in self.page_positions:
-                                self.page_positions[text] = []
-                            self.page_positions[text].append((page_num, position_category))
-
-    def categorize_position(self, y_coord, page_height):
-        """Categorize text position on page (header, body, footer)"""
-        relative_pos = y_coord / page_height
-        if relative_pos < 0.15:
-            return "header"
-        elif relative_pos > 0.85:
-            return "footer"
-        else:
-            return "body"
+                            self.page_positions.setdefault(text, []).append((page_num, position_category))
+
+                        if len(text) >= 4:
+                            self._candidates.append((text, page_num, font_size, is_bold))
+
+        # If appears on many pages, likely repetitive
+        self._repetitive_set = frozenset(
+            text for text, frequency in self.text_frequency.items()
+            if frequency > 2 and self._is_header_footer_positioned(text)
+        )
+
+    def _is_header_footer_positioned(self, text):
+        """Check if text is consistently in header/footer positions"""
+        position_types = [pos[1] for pos in self.page_positions.get(text, [])]
+        return position_types.count("header") > 1 or position_types.count("footer") > 1
 
     def is_repetitive_element(self, text):
         """Check if text appears frequently across pages (likely header/footer)"""
-        if text not in self.text_frequency:
-            return False
-            
-        frequency = self.text_frequency[text]
-        positions = self.page_positions.get(text, [])
-        
-        # If appears on many pages, likely repetitive
-        if frequency > 2:
-            # Check if consistently in header/footer positions
-            position_types = [pos[1] for pos in positions]
-            if position_types.count("header") > 1 or position_types.count("footer") > 1:
-                return True
-                
-        return False
+        return text in self._repetitive_set
 
     def is_structural_noise(self, text):
         """Identify text that's likely structural noise rather than content"""
-        # Very short text
-        if len(text.strip()) < 4:
-            return True
-            
-        # Only numbers or simple patterns
-        if re.match(r'^[\d\s\-\.\,\/]+$', text):
-            return True
-            
-        # Check against exclusion patterns
-        for pattern in self.exclusion_patterns:
-            if re.match(pattern, text, re.IGNORECASE):
-                return True
-                
-        return False
+        return _is_structural_noise(text)
 
     def has_heading_characteristics(self, text, font_info=None):
         """Determine if text has characteristics typical of headings"""
         # Must have substantial alphabetic content
-        alpha_count = sum(1 for c in text if c.isalpha())
+        alpha_count = sum(map(str.isalpha, text))
         if alpha_count < 3:
             return False
             
@@ -154,9 +275,10 @@ class PDFOutlineExtractor:
             return False
             
         # Should not contain too many special characters relative to length
-        special_chars = sum(1 for c in text if not c.isalnum() and not c.isspace())
-        if len(text) > 5 and special_chars / len(text) > 0.3:
-            return False
+        if len(text) > 5:
+            special_chars = len(_ALNUM_OR_SPACE_RE.sub("", text))
+            if special_chars / len(text) > 0.3:
+                return False
             
         return True
 
@@ -171,9 +293,11 @@ class PDFOutlineExtractor:
             text = doc[page_num].get_text()
             lines = [line.strip() for line in text.split('\n') if line.strip()]
             for line in lines[:10]:
+                # Numbered lines ("1. ...") are section headings, not the title;
+                # the prefix test skips the regex for lines not starting with a digit
                 if (len(line) > 10 and 
+                    not (line[:1].isdecimal() and _NUMBERED_LINE_RE.match(line)) and
                     not self.is_structural_noise(line) and
-                    not re.match(r'^\d+\.', line) and
                     self.has_heading_characteristics(line)):
                     return line
                     
@@ -187,112 +311,100 @@ class PDFOutlineExtractor:
         self.analyze_document_structure(doc)
         
         title = self.extract_title_from_pdf(doc)
-        outline = {"title": title, "children": []}
+        # "children" is only added to a node once it has one, so the
+        # exported outline never carries empty arrays
+        outline = {"title": title}
         current_level = []
 
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            text_dict = page.get_text("dict")
-            
-            for block in text_dict.get("blocks", []):
-                if "lines" in block:
-                    for line in block["lines"]:
-                        line_text = ""
-                        font_size = 0
-                        is_bold = False
-                        
-                        for span in line.get("spans", []):
-                            line_text += span.get("text", "")
-                            font_size = max(font_size, span.get("size", 0))
-                            flags = span.get("flags", 0)
-                            if flags & 2**4:  # Bold flag
-                                is_bold = True
-
-                        text = line_text.strip()
-                        
-                        # Skip if structural noise or repetitive
-                        if (self.is_structural_noise(text) or 
-                            self.is_repetitive_element(text) or
-                            not self.has_heading_characteristics(text)):
-                            continue
+        for text, page_num, font_size, is_bold in self._candidates:
+            # Skip if structural noise or repetitive (cheapest checks first)
+            if (self.is_repetitive_element(text) or
+                self.is_structural_noise(text) or
+                not self.has_heading_characteristics(text)):
+                continue
+
+            level = self.detect_level(text)
+            if not level:
+                continue
 
-                        level = self.detect_level(text)
-                        if level and text not in self.seen_headings:
-                            heading = {
-                                "level": level,
-                                "text": text,
-                                "page": page_num + 1,
-                                "children": []
-                            }
+            # Check-and-insert in a single set probe: the set only grows for new text
+            seen_count = len(self.seen_headings)
+            self.seen_headings.add(text)
+            if len(self.seen_headings) == seen_count:
+                continue
 
-                            self.seen_headings.add(text)
+            heading = {
+                "level": level,
+                "text": text,
+                "page": page_num + 1
+            }
 
-                            # Build hierarchy
-                            while (current_level and 
-                                   self._get_level_weight(current_level[-1]["level"]) >= 
-                                   self._get_level_weight(level)):
-                                current_level.pop()
+            # Build hierarchy
+            while (current_level and 
+                   self._get_level_weight(current_level[-1]["level"]) >= 
+                   self._get_level_weight(level)):
+                current_level.pop()
 
-                            if current_level:
-                                current_level[-1]["children"].append(heading)
-                            else:
-                                outline["children"].append(heading)
+            parent = current_level[-1] if current_level else outline
+            parent.setdefault("children", []).append(heading)
 
-                            current_level.append(heading)
+            current_level.append(heading)
 
+        self._candidates = []
         doc.close()
         return outline
 
     def detect_level(self, text):
         """Detect heading level based on patterns"""
-        for pattern, level in self.patterns:
-            if re.match(pattern, text):
-                return level
-        return None
+        return _detect_level(text)
 
     def _get_level_weight(self, level):
         """Get numeric weight for heading level"""
         return {"H1": 1, "H2": 2, "H3": 3, "H4": 4}.get(level, float("inf"))
 
+def _process_one(pdf_path):
+    """Extract the outline of a single PDF (runs in a worker process)"""
+    logger.info(f"Processing {Path(pdf_path).name}...")
+    # Fresh extractor per document: its state is per-document anyway
+    return PDFOutlineExtractor().extract_outline(pdf_path)
+
+def _write_json(output_file, result):
+    """Save an outline as JSON (runs on the writer thread)"""
+    try:
+        # orjson emits UTF-8 bytes directly, so write in binary mode
+        with open(output_file, "wb") as f:
+            f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+        logger.info(f"Saved outline to {output_file.name}")
+    except Exception as e:
+        logger.error(f"Error writing {output_file.name}: {str(e)}")
+
 def main():
     """Main function to process PDFs"""
     input_dir = Path("/app/input")
     output_dir = Path("/app/output")
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    extractor = PDFOutlineExtractor()
     pdf_files = list(input_dir.glob("*.pdf"))
 
     if not pdf_files:
         logger.warning("No PDF files found in input directory")
         return
 
-    for pdf_file in pdf_files:
-        try:
-            logger.info(f"Processing {pdf_file.name}...")
-            result = extractor.extract_outline(str(pdf_file))
-            
-            # Clean up result - remove empty children arrays
-            def clean_outline(node):
-                if isinstance(node, dict):
-                    if "children" in node and not node["children"]:
-                        del node["children"]
-                    else:
-                        for child in node.get("children", []):
-                            clean_outline(child)
-                elif isinstance(node, list):
-                    for item in node:
-                        clean_outline(item)
-            
-            clean_outline(result)
-            
-            output_file = output_dir / f"{pdf_file.stem}.json"
-            with open(output_file, "w", encoding="utf-8") as f:
-                ujson.dump(result, f, indent=2, ensure_ascii=False)
-            logger.info(f"Saved outline to {output_file.name}")
-            
-        except Exception as e:
-            logger.error(f"Error processing {pdf_file.name}: {str(e)}")
+    # Each PDF is independent and CPU-bound, so spread them across processes;
+    # a single writer thread saves finished outlines while parsing continues
+    max_workers = min(len(pdf_files), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor, \
+         ThreadPoolExecutor(max_workers=1) as writer:
+        futures = {executor.submit(_process_one, str(pdf_file)): pdf_file
+                   for pdf_file in pdf_files}
+        for future in as_completed(futures):
+            pdf_file = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Error processing {pdf_file.name}: {str(e)}")
+                continue
+            writer.submit(_write_json, output_dir / f"{pdf_file.stem}.json", result)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file